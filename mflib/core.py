@@ -97,6 +97,8 @@ class Core:
         """
         # Set the slice name
         self._slice_name = value
+        # Bootstrap status belongs to the previous slice
+        self._bss_cache = None
 
         # Create the local slice directory
         try:
@@ -175,6 +177,16 @@ class Core:
         """
         return os.path.join(self.local_slice_directory, "mfuser_pubic_key")
 
+    @property
+    def local_mfuser_setup_script_filename(self):
+        """
+        The local copy of the script that creates the mfuser account on each node.
+
+        Returns:
+            String: The local copy of the mfuser account setup script.
+        """
+        return os.path.join(self.local_slice_directory, "mfuser_setup.sh")
+
     @property
     def meas_node(self):
         """
@@ -340,6 +352,8 @@ class Core:
 
         # The slice_name
         self._slice_name = ""
+        # Last known bootstrap status, kept in step with _update_bootstrap
+        self._bss_cache = None
         self.mf_repo_branch = mf_repo_branch
 
         self.core_logger = None
@@ -362,6 +376,8 @@ class Core:
         self.measurement_node_name = "meas-node"
         # Services directory on meas node
         self.services_directory = os.path.join("/", "home", "mfuser", "services")
+        # Marker file on meas node written once bootstrapping is complete
+        self.bootstrap_ready_marker = os.path.join("/", "home", "mfuser", ".bootstrap_ready")
         # Base names for keys
         self.mfuser_private_key_filename = "mfuser_private_key"
         self.mfuser_public_key_filename = "mfuser_public_key"
@@ -963,6 +979,7 @@ class Core:
 
         if os.path.exists(self.bootstrap_status_file):
             if os.stat(self.bootstrap_status_file).st_size == 0:
+                self._bss_cache = {}
                 return {}
                 # workaround download creating empty file if file not found
             with open(self.bootstrap_status_file) as bsf:
@@ -970,14 +987,17 @@ class Core:
                     bootstrap_dict = json.load(bsf)
                     # print(bootstrap_dict)
                     if bootstrap_dict:
+                        self._bss_cache = dict(bootstrap_dict)
                         return bootstrap_dict
                     else:
+                        self._bss_cache = {}
                         return {}
                 except Exception as e:
                     print(f"Bootstrap failed to decode")
                     print(f"Fail: {e}")
                     return {}
         else:
+            self._bss_cache = {}
             return {}
 
     def _clear_bootstrap_status(self):
@@ -990,10 +1010,11 @@ class Core:
         # Delete local copy
         if os.path.exists(self.bootstrap_status_file):
             os.remove(self.bootstrap_status_file)
+        self._bss_cache = None
 
         # Delete measurement node copy
         try:
-            full_command = "rm bootstrap_status.json"
+            full_command = f"rm bootstrap_status.json; sudo rm -f {self.bootstrap_ready_marker}"
             stdout, stderr = self.meas_node.execute(full_command)
             self.core_logger.info("Removed remote bootstrap_status file.")
         except Exception as e:
@@ -1002,6 +1023,36 @@ class Core:
             if stdout: self.core_logger.debug(f"STDOUT: {stdout}")
             if stderr: self.core_logger.debug(f"STDERR: {stderr}")
 
+    def _bootstrap_ready_marker_exists(self):
+        """
+        Checks for the bootstrap ready marker on the meas node.
+
+        Returns:
+            Boolean: True if the marker file exists, False otherwise or if the check fails.
+        """
+        try:
+            stdout, stderr = self.meas_node.execute(
+                f"if sudo test -f {self.bootstrap_ready_marker}; then echo READY; fi",
+                quiet=True,
+            )
+            return "READY" in stdout
+        except Exception as e:
+            self.core_logger.warning(f"Bootstrap ready marker check failed: {e}")
+            return False
+
+    def _set_bootstrap_ready_marker(self):
+        """
+        Writes the bootstrap ready marker on the meas node. See _bootstrap_ready_marker_exists.
+        """
+        try:
+            stdout, stderr = self.meas_node.execute(
+                f"sudo -u mfuser touch {self.bootstrap_ready_marker}", quiet=True
+            )
+            if stderr:
+                self.core_logger.error(f"STDERR: {stderr}")
+        except Exception as e:
+            self.core_logger.exception(f"Setting bootstrap ready marker failed: {e}")
+
     def _download_bootstrap_status(self):
         """
         Downloads the bootstrap file from the meas_node. The downloaded file will be stored locally for future reference at self.bootstrap_status_file.
@@ -1074,10 +1125,13 @@ class Core:
     def _update_bootstrap(self, key, value):
         """
         Updates the given key to the given value in the bootstrap_status.json file on the meas node.
+        The status is only downloaded if it has not already been read for this slice.
         """
-        bsf_dict = self.get_bootstrap_status()
-        # self.download_bootstrap_status()
-        # bsf_dict = {}
+        if self._bss_cache is None:
+            self.get_bootstrap_status()
+        if self._bss_cache is None:
+            self._bss_cache = {}
+        bsf_dict = self._bss_cache
         bsf_dict[key] = value
 
         with open(self.bootstrap_status_file, "w") as bsf:
@@ -25,6 +25,9 @@
 import json
 import traceback
 import os
+from collections import defaultdict
+from concurrent.futures import as_completed
+from pathlib import Path
 
 from fabrictestbed_extensions.fablib.fablib import fablib
 
@@ -34,11 +37,58 @@ from fabrictestbed_extensions.fablib.fablib import FablibManager
 from cryptography.hazmat.primitives import serialization as crypto_serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.backends import default_backend as crypto_default_backend
-from os import chmod
 
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 from mflib.core import Core
+from mflib.executor import get_executor
+
+
+# Run as root on every node to create the mfuser account. Safe to rerun.
+# Expects mfuser.pub to have been uploaded to the working directory.
+_MFUSER_SETUP_SCRIPT = """#!/bin/bash
+set -euo pipefail
+id -u mfuser > /dev/null 2>&1 || useradd -s /bin/bash -G root -m mfuser
+install -d -m 700 -o mfuser -g mfuser /home/mfuser/.ssh
+sudoers_line='mfuser ALL=(ALL:ALL) NOPASSWD: ALL'
+grep -qxF "$sudoers_line" /etc/sudoers.d/90-cloud-init-users 2> /dev/null || echo "$sudoers_line" >> /etc/sudoers.d/90-cloud-init-users
+install -m 644 -o mfuser -g mfuser mfuser.pub /home/mfuser/.ssh/mfuser.pub
+install -m 644 -o mfuser -g mfuser mfuser.pub /home/mfuser/.ssh/authorized_keys
+rm -f mfuser.pub mfuser_setup.sh
+"""
+
+# One Ansible inventory line per node in hosts.ini
+_HOSTS_LINE_TMPL = (
+    "{name} "
+    "ansible_host={ip} "
+    "hostname={ip} "
+    "ansible_ssh_user={user} "
+    "node_exporter_listen_ip={ip} "
+    "ansible_ssh_common_args='-o StrictHostKeyChecking=no' "
+    'management_ip_type="{mgmt}"'
+)
+
+
+def _write_secret(path, data, mode):
+    """
+    Writes data to path with the given file mode. The file is opened with the mode set
+    so it is never readable with looser permissions, even briefly.
+
+    Args:
+        path (str): File to write. Truncated if it already exists.
+        data (str or bytes): Contents to write.
+        mode (int): Permission bits, such as 0o600.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        # The mode given to os.open only applies when the file is created.
+        os.fchmod(fd, mode)
+        os.write(fd, data.encode("utf-8") if isinstance(data, str) else data)
+    finally:
+        os.close(fd)
 
 
 class MFLib(Core):
@@ -72,13 +122,36 @@ class MFLib(Core):
         # Remove existing log handler if present
         if self.mflib_log_handler:
             self.remove_mflib_log_handler(self.mflib_log_handler)
+        if self._mflib_log_listener:
+            self._stop_mflib_log_listener()
 
         file_handler = logging.FileHandler(self.log_filename)
         file_handler.setLevel(self.log_level)
         file_handler.setFormatter(formatter)
 
+        # The file handler is driven by a listener thread so log calls only enqueue
+        # the record and never wait on the disk write.
+        log_queue = queue.Queue(-1)
+        self._mflib_log_listener = QueueListener(
+            log_queue, file_handler, respect_handler_level=True
+        )
+        self._mflib_log_listener.start()
+        atexit.register(self._stop_mflib_log_listener)
+
         # self.mflib_logger.addHandler(file_handler)
-        self.add_mflib_log_handler(file_handler)
+        self.mflib_log_handler = QueueHandler(log_queue)
+        self.add_mflib_log_handler(self.mflib_log_handler)
+
+    def _stop_mflib_log_listener(self):
+        """
+        Flushes any queued log records to the log file, stops the listener thread and closes the file.
+        """
+        if self._mflib_log_listener:
+            atexit.unregister(self._stop_mflib_log_listener)
+            self._mflib_log_listener.stop()
+            for handler in self._mflib_log_listener.handlers:
+                handler.close()
+            self._mflib_log_listener = None
 
     def remove_mflib_log_handler(self, log_handler):
         """
@@ -122,11 +195,9 @@ class MFLib(Core):
             network_type (string, optional): _description_. Defaults to FABNetv4.
             site (string, optional): _description_. Defaults to NCSA.
         """
-        interfaces = {}
+        interfaces = defaultdict(list)
         for node in slice.get_nodes():
             this_site = node.get_site()
-            if this_site not in interfaces.keys():
-                interfaces[this_site] = []
             this_nodename = node.get_name()
             this_interface = node.add_component(
                 model="NIC_Basic", name=(f"meas_nic_{this_nodename}_{this_site}")
@@ -141,17 +212,15 @@ class MFLib(Core):
 
         meas.set_capacities(cores=cores, ram=ram, disk=disk)
         meas.set_image(meas_image)
-        if site not in interfaces.keys():
-            interfaces[site] = []
         if network_type == "FABNetv4":
             meas_interface = meas.add_component(
                 model="NIC_Basic", name=(f"meas_nic_{meas_nodename}_{site}")
             ).get_interfaces()[0]
             (interfaces[site]).append(meas_interface)
 
-            for site in interfaces.keys():
+            for site, site_interfaces in interfaces.items():
                 slice.add_l3network(
-                    name=f"l3_meas_net_{site}", interfaces=interfaces[site]
+                    name=f"l3_meas_net_{site}", interfaces=site_interfaces
                 )
         else:
             logging.info(f"Unknown {network_type} Network type")
@@ -180,10 +249,30 @@ class MFLib(Core):
             mf_repo_branch=mf_repo_branch,
         )
         self.mflib_log_handler = None
+        self._mflib_log_listener = None
+        # Node & network lists fetched from the slice, see _nodes() and _networks()
+        self._nodes_cache = None
+        self._networks_cache = None
+        # Management IP type ("IPv4"/"IPv6") per node name, see _mgmt_kind()
+        self._mgmt_kind_cache = {}
 
         if slice_name:
             self.init(slice_name, optimize_repos)
 
+    @staticmethod
+    def _generate_mfuser_key():
+        """
+        Generates a new RSA private key for the mfuser account.
+
+        Returns:
+            rsa.RSAPrivateKey: The generated key.
+        """
+        return rsa.generate_private_key(
+            backend=crypto_default_backend(),
+            public_exponent=65537,
+            key_size=2048,
+        )
+
     def init(self, slice_name, optimize_repos):
         """
         Sets up the slice to ensure it can be monitored. Sets up basic software on Measurement Node and experiment nodes.
@@ -204,7 +293,16 @@ class MFLib(Core):
         ########################
         self.slice_name = slice_name
 
+        # Start generating the mfuser key while the slice and bootstrap status are fetched.
+        # It is only used if the bootstrap status shows the keys have not been made yet.
+        self._keygen_future = None
+        if not os.path.exists(self.local_mfuser_private_key_filename):
+            self._keygen_future = get_executor().submit(self._generate_mfuser_key)
+
         self.slice = fablib.get_slice(name=slice_name)
+        self._nodes_cache = None
+        self._networks_cache = None
+        self._mgmt_kind_cache = {}
 
         self.set_mflib_logger()
 
@@ -236,6 +334,15 @@ class MFLib(Core):
             f"Found meas node as {self.meas_node.get_name()} at {self.meas_node.get_management_ip()}"
         )
 
+        # A fully bootstrapped slice leaves a marker file on the meas node.
+        # Checking for it is cheaper than downloading and parsing the full bootstrap status.
+        if self._bootstrap_ready_marker_exists():
+            self.get_mfuser_private_key()
+            msg = "Bootstrap marker indicates Slice Measurement Framework is ready."
+            print(msg)
+            self.mflib_logger.info(msg)
+            return True
+
         bss = self.get_bootstrap_status()
         if "msg" in bss:
             print(f"Bootstrap Download failed {bss['msg']}")
@@ -254,11 +361,13 @@ class MFLib(Core):
         if "status" in bss and bss["status"] == "ready":
             # Slice already instrumentized and ready to go.
             self.get_mfuser_private_key()
+            # Slices bootstrapped before the marker existed get it now.
+            self._set_bootstrap_ready_marker()
             print("Bootstrap status indicates Slice Measurement Framework is ready.")
             self.mflib_logger.info(
                 "Bootstrap status indicates Slice Measurement Framework is ready."
             )
-            return
+            return True
         else:
             ###############################
             # Need to do some bootstrapping
@@ -274,11 +383,10 @@ class MFLib(Core):
                 # if True:
                 print("Generating MFUser Keys...")
                 self.mflib_logger.info("Generating MFUser Keys...")
-                key = rsa.generate_private_key(
-                    backend=crypto_default_backend(),
-                    public_exponent=65537,
-                    key_size=2048,
-                )
+                if self._keygen_future:
+                    key = self._keygen_future.result()
+                else:
+                    key = self._generate_mfuser_key()
 
                 private_key = key.private_bytes(
                     crypto_serialization.Encoding.PEM,
@@ -295,18 +403,13 @@ class MFLib(Core):
                 private_key_str = private_key.decode("utf-8")
                 public_key_str = public_key.decode("utf-8")
 
-                # Save public key & change mode
-                public_key_file = open(self.local_mfuser_public_key_filename, "w")
-                public_key_file.write(public_key_str)
-                public_key_file.write("\n")
-                public_key_file.close()
-                chmod(self.local_mfuser_public_key_filename, 0o644)
-
-                # Save private key & change mode
-                private_key_file = open(self.local_mfuser_private_key_filename, "w")
-                private_key_file.write(private_key_str)
-                private_key_file.close()
-                chmod(self.local_mfuser_private_key_filename, 0o600)
+                # Save keys, created with their final mode
+                _write_secret(
+                    self.local_mfuser_public_key_filename, public_key_str + "\n", 0o644
+                )
+                _write_secret(
+                    self.local_mfuser_private_key_filename, private_key_str, 0o600
+                )
 
                 # Upload mfuser keys to default user dir for future retrieval
                 self._upload_mfuser_keys()
@@ -329,51 +432,61 @@ class MFLib(Core):
                 print(msg)
                 mfusers_install_success = True
 
-                # Upload keys
-                # Ansible.pub is nolonger a good name here
-                threads = []
-                for node in self.slice.get_nodes():
-                    try:
-                        threads.append(
-                            node.upload_file(
-                                self.local_mfuser_public_key_filename, "mfuser.pub"
-                            )
-                        )
+                with open(self.local_mfuser_setup_script_filename, "w") as f:
+                    f.write(_MFUSER_SETUP_SCRIPT)
 
-                    except Exception as e:
-                        print(f"Failed to upload keys: {e}")
-                        self.mflib_logger.exception("Failed to upload keys.")
+                def upload_mfuser_files(node):
+                    # Ansible.pub is nolonger a good name here
+                    node.upload_file(self.local_mfuser_public_key_filename, "mfuser.pub")
+                    node.upload_file(
+                        self.local_mfuser_setup_script_filename, "mfuser_setup.sh"
+                    )
 
+                nodes = self._nodes()
+                executor = get_executor()
+                # Upload keys & setup script
+                upload_futures = {
+                    executor.submit(upload_mfuser_files, node): node
+                    for node in nodes
+                }
+                for future in as_completed(upload_futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        node_name = upload_futures[future].get_name()
+                        print(f"Failed to upload keys to {node_name}: {e}")
+                        self.mflib_logger.exception(f"Failed to upload keys to {node_name}.")
                         mfusers_install_success = False
 
                 # Add user
-                threads = []
-                cmd = (
-                    f"sudo useradd -s /bin/bash -G root -m mfuser;"
-                    f"sudo mkdir /home/mfuser/.ssh;"
-                    f"sudo chmod 700 /home/mfuser/.ssh;"
-                    f"echo 'mfuser ALL=(ALL:ALL) NOPASSWD: ALL' | sudo tee -a /etc/sudoers.d/90-cloud-init-users;"
-                    f"sudo mv mfuser.pub /home/mfuser/.ssh/mfuser.pub;"
-                    f"sudo cat /home/mfuser/.ssh/mfuser.pub | sudo tee -a /home/mfuser/.ssh/authorized_keys;"
-                    f"sudo chmod 644 /home/mfuser/.ssh/authorized_keys;"
-                    f"sudo chown -R mfuser:mfuser /home/mfuser/.ssh;"
-                )
-
-                for node in self.slice.get_nodes():
+                # execute does not raise on a non-zero exit, so success is signalled on stdout.
+                execute_futures = {
+                    executor.submit(
+                        node.execute,
+                        "sudo bash mfuser_setup.sh && echo MFUSER_SETUP_OK",
+                        quiet=True,
+                    ): node
+                    for node in nodes
+                }
+                for future, node in execute_futures.items():
                     try:
-                        threads.append(node.execute_thread(cmd))
-
+                        stdout, stderr = future.result()
                     except Exception as e:
-                        print(f"Failed to setup mfuser: {e}")
-                        self.mflib_logger.exception(f"Failed to setup mfuser user.")
+                        print(f"Failed to setup mfuser on {node.get_name()}: {e}")
+                        self.mflib_logger.exception(
+                            f"Failed to setup mfuser user on {node.get_name()}."
+                        )
                         mfusers_install_success = False
-
-                for thread in threads:
-                    stdout, stderr = thread.result()
+                        continue
                     if stdout:
                         self.core_logger.debug(f"STDOUT useradd mfuser: {stdout}")
                     if stderr:
                         self.core_logger.error(f"STDERR useradd mfuser: {stderr}")
+                    if "MFUSER_SETUP_OK" not in stdout:
+                        msg = f"mfuser setup script failed on {node.get_name()}."
+                        print(msg)
+                        self.mflib_logger.error(msg)
+                        mfusers_install_success = False
 
                 if not self._copy_mfuser_keys_to_mfuser_on_meas_node():
                     mfusers_install_success = False
@@ -411,13 +524,12 @@ class MFLib(Core):
                 msg = f"Measurement Framework github repository already cloned."
                 print(msg)
                 self.mflib_logger.info(msg)
+                clone_future = None
             else:
                 # if True:
-                if self._clone_mf_repo():
-                    self._update_bootstrap("repo_cloned", "ok")
-                else:
-                    msg = f"Measurement Framework github repository clone Failed."
-                    return False
+                # The clone only needs the mfuser account, so it runs in the background
+                # while the measurement network and hosts files are set up below.
+                clone_future = get_executor().submit(self._clone_mf_repo)
 
             #######################################
             # Create measurement network interfaces
@@ -436,13 +548,39 @@ class MFLib(Core):
             # Set the measurement node
             # in the hosts files
             #######################
+            hosts_set_failed = False
             if "hosts_set" in bss and bss["hosts_set"] == "ok":
                 msg = f"/etc/host entries already set."
                 print(msg)
                 self.mflib_logger.info(msg)
             else:
-                self._set_all_hosts_file()
-                self._update_bootstrap("hosts_set", "ok")
+                hosts_set_results = self._set_all_hosts_file()
+                self.mflib_logger.info(f"hosts_set: {hosts_set_results}")
+                failed_nodes = [
+                    name
+                    for name, status in hosts_set_results.items()
+                    if status == "failed"
+                ]
+                if failed_nodes:
+                    msg = f"Setting /etc/hosts entries failed on {', '.join(failed_nodes)}."
+                    print(msg)
+                    self.mflib_logger.error(msg)
+                    hosts_set_failed = True
+                else:
+                    self._update_bootstrap("hosts_set", "ok")
+
+            if clone_future:
+                if clone_future.result():
+                    self._update_bootstrap("repo_cloned", "ok")
+                else:
+                    msg = f"Measurement Framework github repository clone Failed."
+                    print(msg)
+                    self.mflib_logger.error(msg)
+                    return False
+
+            # Stop here, after the clone has been recorded, so the next init retries hosts_set
+            if hosts_set_failed:
+                return False
 
             #######################
             # Run Bootstrap script
@@ -466,6 +604,7 @@ class MFLib(Core):
                 self._update_bootstrap("bootstrap_ansible", "ok")
 
             self._update_bootstrap("status", "ready")
+            self._set_bootstrap_ready_marker()
             print("Inititialization Done.")
             self.mflib_logger.info("Inititialization Done.")
             return True
@@ -493,6 +632,8 @@ class MFLib(Core):
 
         self.mflib_logger.debug(msg)
 
+        # Services are set up one at a time: each create runs an Ansible deployment
+        # against the same hosts, and concurrent runs would contend for package locks.
         for service in services:
             service = service.strip()
             if "prometheus" == service:
@@ -547,6 +688,51 @@ class MFLib(Core):
 
         return all_data
 
+    def _nodes(self):
+        """
+        The slice's nodes. Fetched from the slice once and reused until a new slice is set by init.
+
+        Returns:
+            List: fablib node objects in the slice.
+        """
+        if self._nodes_cache is None:
+            self._nodes_cache = self.slice.get_nodes()
+        return self._nodes_cache
+
+    def _networks(self):
+        """
+        The slice's networks. Fetched from the slice once and reused until a new slice is set by init.
+
+        Returns:
+            List: fablib network objects in the slice.
+        """
+        if self._networks_cache is None:
+            self._networks_cache = self.slice.get_networks()
+        return self._networks_cache
+
+    def _mgmt_kind(self, node):
+        """
+        The type of the node's management IP address. Looked up once per node and reused.
+
+        Args:
+            node (fablib.node): Node in the slice.
+        Returns:
+            String: "IPv4" or "IPv6" as given by node.validIPAddress.
+        """
+        name = node.get_name()
+        kind = self._mgmt_kind_cache.get(name)
+        if kind is None:
+            kind = node.validIPAddress(node.get_management_ip())
+            self._mgmt_kind_cache[name] = kind
+        return kind
+
+    def _mgmt_kind_is_v6(self, node):
+        """
+        Returns:
+            Bool: True if the node is managed over IPv6.
+        """
+        return self._mgmt_kind(node) == "IPv6"
+
     def _make_hosts_ini_file(self, set_ip=False):
         hosts = []
         mfuser = "mfuser"
@@ -555,56 +741,61 @@ class MFLib(Core):
             print(msg)
             self.mflib_logger.info(msg)
 
-        meas_node = self.slice.get_node(name=self.measurement_node_name)
+        meas_node = self.meas_node
         meas_site = meas_node.get_site()
-        meas_network = self.slice.get_network(name=f"l3_meas_net_{meas_site}")
-        meas_net_subnet = meas_network.get_subnet()
-        networks = self.slice.get_networks()
-
-        for network in networks:
-            network_name = network.get_name()
-            network_type = network.get_type()
-            if str(network_type) == "FABNetv4" and network_name.startswith(
-                "l3_meas_net_"
-            ):
-                network_site = network.get_site()
-                network_subnet = network.get_subnet()
-                interfaces = network.get_interfaces()
-                available_ips = network.get_available_ips()
-                for interface in interfaces:
-                    ip_addr = available_ips.pop(0)
-                    interface.ip_addr_add(addr=ip_addr, subnet=network_subnet)
-                    interface.ip_link_up()
-                    node = interface.get_node()
-                    if node.get_reservation_id() == meas_node.get_reservation_id():
-                        for other_network in networks:
-                            if other_network.get_name() == network_name:
-                                continue
-                            if str(
-                                other_network.get_type()
-                            ) == "FABNetv4" and other_network.get_name().startswith(
-                                "l3_meas_net_"
-                            ):
-                                node.ip_route_add(
-                                    subnet=other_network.get_subnet(),
-                                    gateway=network.get_gateway(),
-                                )
-                    else:
-                        node.ip_route_add(
-                            subnet=meas_net_subnet, gateway=network.get_gateway()
+        meas_nets_by_name = {
+            network.get_name(): network
+            for network in self._networks()
+            if str(network.get_type()) == "FABNetv4"
+            and network.get_name().startswith("l3_meas_net_")
+        }
+        meas_net_subnet = meas_nets_by_name[f"l3_meas_net_{meas_site}"].get_subnet()
+
+        meas_rid = meas_node.get_reservation_id()
+        node_rid = {node.get_name(): node.get_reservation_id() for node in self._nodes()}
+
+        for network_name, network in meas_nets_by_name.items():
+            network_subnet = network.get_subnet()
+            network_gateway = network.get_gateway()
+            interfaces = network.get_interfaces()
+            available_ips = network.get_available_ips()
+            for interface in interfaces:
+                ip_addr = available_ips.pop(0)
+                interface.ip_addr_add(addr=ip_addr, subnet=network_subnet)
+                interface.ip_link_up()
+                node = interface.get_node()
+                node_name = node.get_name()
+                if node_rid[node_name] == meas_rid:
+                    # Route to every other site's meas net with one ip invocation.
+                    # replace + -force keep a rerun from stopping at an existing route.
+                    route_cmds = [
+                        f"route replace {other_network.get_subnet()} via {network_gateway}"
+                        for other_network_name, other_network in meas_nets_by_name.items()
+                        if other_network_name != network_name
+                    ]
+                    if route_cmds:
+                        stdout, stderr = node.execute(
+                            "sudo ip -force -batch - <<'MFROUTES'\n"
+                            + "\n".join(route_cmds)
+                            + "\nMFROUTES\n",
+                            quiet=True,
                         )
-                    hosts.append(
-                        f"{node.get_name()} "
-                        f"ansible_host={ip_addr} "
-                        f"hostname={ip_addr} "
-                        f"ansible_ssh_user={mfuser} "
-                        f"node_exporter_listen_ip={ip_addr} "
-                        f"ansible_ssh_common_args='-o StrictHostKeyChecking=no' "
-                        f'management_ip_type="{node.validIPAddress(node.get_management_ip())}"'
+                        if stderr:
+                            self.mflib_logger.error(f"STDERR: {stderr}")
+                else:
+                    node.ip_route_add(subnet=meas_net_subnet, gateway=network_gateway)
+                hosts.append(
+                    _HOSTS_LINE_TMPL.format_map(
+                        {
+                            "name": node_name,
+                            "ip": ip_addr,
+                            "user": mfuser,
+                            "mgmt": self._mgmt_kind(node),
+                        }
                     )
+                )
 
         # Prometheus e_Elk
-        hosts_txt = ""
         # e_hosts_txt = ""
         hosts_tail = f"""
 
@@ -615,29 +806,27 @@ Meas_Node
 Experiment_Nodes
 """
 
-        experiment_nodes = "[Experiment_Nodes]\n"
-        e_experiment_nodes = "[workers]\n"
+        meas_lines = []
+        worker_lines = []
         for host in hosts:
             if self.measurement_node_name in host:
-                hosts_txt += "[Meas_Node]\n"
-                hosts_txt += host + "\n\n"
+                meas_lines.append(host)
             else:  # It is an experimenters node
-                experiment_nodes += host + "\n"
+                worker_lines.append(host)
 
-        hosts_txt += experiment_nodes
-        hosts_txt += hosts_tail
+        hosts_txt = (
+            "\n".join(
+                ["[Meas_Node]", *meas_lines, "", "[Experiment_Nodes]", *worker_lines]
+            )
+            + "\n"
+            + hosts_tail
+        )
         hosts_ini = "hosts.ini"
 
         local_prom_hosts_filename = os.path.join(self.local_slice_directory, hosts_ini)
 
-        with open(local_prom_hosts_filename, "w") as f:
-            f.write(hosts_txt)
+        Path(local_prom_hosts_filename).write_text(hosts_txt)
 
-        remote_dir = "/tmp"
-        # Upload the files to the meas node and move to correct locations
-        self.meas_node.upload_file(
-            local_prom_hosts_filename, f"{remote_dir}/{hosts_ini}"
-        )
         msg = f"Measurement Network setup complete."
         print(msg)
         self.mflib_logger.info(msg)
@@ -647,10 +836,13 @@ Experiment_Nodes
         print(msg)
         self.mflib_logger.info(msg)
 
+        # The inventory is small so it is sent inline with the command rather than uploaded and moved.
         stdout, stderr = self.meas_node.execute(
-            f"sudo mkdir -p /home/mfuser/services/common;"
-            f"sudo mv {remote_dir}/{hosts_ini} /home/mfuser/services/common/hosts.ini;"
-            f"sudo chown -R mfuser:mfuser /home/mfuser/services /home/mfuser/mf_git;",
+            f"sudo install -d -o mfuser -g mfuser /home/mfuser/services/common && "
+            f"sudo tee /home/mfuser/services/common/{hosts_ini} > /dev/null <<'MFHOSTS'\n"
+            f"{hosts_txt}"
+            f"MFHOSTS\n"
+            f"sudo chown -R mfuser:mfuser /home/mfuser/services;",
             quiet=True,
         )
         if stderr:
@@ -673,9 +865,8 @@ Experiment_Nodes
                 local_file_path, remote_file_path, retry=1
             )  # , retry=3, retry_interval=10): # note retry is really tries
 
-            with open(local_file_path) as f:
-                hosts_text = f.read()
-                return local_file_path, hosts_text
+            hosts_text = Path(local_file_path).read_text()
+            return local_file_path, hosts_text
 
         except Exception as e:
             msg = f"downloading common hosts file Failed: {e}"
@@ -742,55 +933,96 @@ Experiment_Nodes
     #     return
 
     def _set_all_hosts_file(self):
-        meas_node_meas_net_ip = None
-        for interface in self.meas_node.get_interfaces():
-            if "meas-node-meas_nic" in interface.get_name():
-                meas_node_meas_net_ip = interface.get_ip_addr()
+        """
+        Adds the measurement node's meas_net address to /etc/hosts on every node in the slice.
+
+        Returns:
+            dict: Node name mapped to "set", "skipped" or "failed".
+        """
+        results = {}
+        meas_interface = next(
+            (
+                interface
+                for interface in self.meas_node.get_interfaces()
+                if "meas-node-meas_nic" in interface.get_name()
+            ),
+            None,
+        )
+        meas_node_meas_net_ip = meas_interface.get_ip_addr() if meas_interface else None
         if meas_node_meas_net_ip:
-            execute_threads = {}
             # cmd = f'sudo echo -n "{meas_node_meas_net_ip} {self.measurement_node_name}" | sudo tee -a /etc/hosts;'
             # TODO WARNING hardcoded _meas_node name here to match existing docker container needs. Need to update
             # cmd = f'sudo echo -n "{meas_node_meas_net_ip} _meas_node" | sudo tee -a /etc/hosts;'
-            cmd = f'sudo echo -n "{meas_node_meas_net_ip} {self.measurement_node_name}\n" | sudo tee -a /etc/hosts; sudo echo -n "{meas_node_meas_net_ip} _meas_node\n" | sudo tee -a /etc/hosts;'
-            for node in self.slice.get_nodes():
-                execute_threads[node] = node.execute_thread(cmd)
-            for node, thread in execute_threads.items():
-                self.mflib_logger.info(
-                    f"Waiting for result from node {node.get_name()}"
-                )
-                stdout, stderr = thread.result()
+            cmd = (
+                f"sudo tee -a /etc/hosts > /dev/null <<'MFEOF'\n"
+                f"{meas_node_meas_net_ip} {self.measurement_node_name}\n"
+                f"{meas_node_meas_net_ip} _meas_node\n"
+                f"MFEOF\n"
+            )
+            nodes = self._nodes()
+
+            def set_hosts(node):
+                try:
+                    stdout, stderr = node.execute(cmd, quiet=True)
+                except Exception as e:
+                    self.mflib_logger.error(
+                        f"Setting /etc/hosts on {node.get_name()} failed: {e}"
+                    )
+                    return "failed"
                 if stdout:
                     self.mflib_logger.info(f"STDOUT: {stdout}")
                 if stderr:
                     self.mflib_logger.error(f"STDERR: {stderr}")
+                return "set"
+
+            executor = get_executor()
+            futures = {executor.submit(set_hosts, node): node for node in nodes}
+            # Record each node as soon as it finishes rather than in slice order.
+            for future in as_completed(futures):
+                results[futures[future].get_name()] = future.result()
+        else:
+            self.mflib_logger.warning(
+                "Measurement node meas_net address not found, /etc/hosts not set."
+            )
+            for node in self._nodes():
+                results[node.get_name()] = "skipped"
+        return results
 
     def _optimize_repos(self):
-        nodes = self.slice.get_nodes()
+        nodes = self._nodes()
+        node_commands = {}
         for node in nodes:
             IPv6Management = False
             ip_proto_index = "4"
             commands = "sudo ip -6 route del default via `ip -6 route show default|grep fe80|awk '{print $3}'` > /dev/null 2>&1"
-            if node.validIPAddress(node.get_management_ip()) == "IPv6":
+            if self._mgmt_kind_is_v6(node):
                 IPv6Management = True
                 ip_proto_index = "6"
-            if [ele for ele in ["rocky", "centos"] if (ele in node.get_image())]:
+            image = node.get_image()
+            if any(ele in image for ele in ("rocky", "centos")):
                 commands = (
-                    f'sudo echo "max_parallel_downloads=10" |sudo tee -a /etc/dnf/dnf.conf;'
-                    f'sudo echo "fastestmirror=True" |sudo tee -a /etc/dnf/dnf.conf;'
-                    f'sudo echo "ip_resolve='
-                    + ip_proto_index
-                    + '" |sudo tee -a /etc/dnf/dnf.conf;'
+                    f"sudo tee -a /etc/dnf/dnf.conf > /dev/null <<'MFEOF'\n"
+                    f"max_parallel_downloads=10\n"
+                    f"fastestmirror=True\n"
+                    f"ip_resolve={ip_proto_index}\n"
+                    f"MFEOF\n"
                 )
-            elif [ele for ele in ["ubuntu", "debian"] if (ele in node.get_image())]:
+            elif any(ele in image for ele in ("ubuntu", "debian")):
                 commands = (
-                    'sudo echo "Acquire::ForceIPv'
-                    + ip_proto_index
-                    + ' "true";" | sudo tee -a /etc/apt/apt.conf.d/1000-force-ipv'
-                    + ip_proto_index
-                    + "-transport"
+                    f"printf 'Acquire::ForceIPv{ip_proto_index} \"true\";\\n' | "
+                    f"sudo tee /etc/apt/apt.conf.d/1000-force-ipv{ip_proto_index}-transport > /dev/null"
                 )
             if commands:
-                stdout, stderr = node.execute(commands, quiet=True)
-                self.mflib_logger.info(f"STDOUT: {stdout}")
-                if stderr:
-                    self.mflib_logger.error(f"STDERR: {stderr}")
+                node_commands[node] = commands
+
+        # The repo settings are independent per node so they are applied concurrently.
+        executor = get_executor()
+        futures = {
+            node: executor.submit(node.execute, commands, quiet=True)
+            for node, commands in node_commands.items()
+        }
+        outputs = {node: future.result() for node, future in futures.items()}
+        for node, (stdout, stderr) in outputs.items():
+            self.mflib_logger.info(f"STDOUT: {stdout}")
+            if stderr:
+                self.mflib_logger.error(f"STDERR: {stderr}")
@@ -26,6 +26,11 @@
 from random import randint
 import os.path
 import itertools
+import shlex
+import tarfile
+from concurrent.futures import as_completed
+
+from mflib.executor import get_executor
 
 def check_owl_prerequisites(slice):
     """
@@ -36,18 +41,24 @@ def check_owl_prerequisites(slice):
     """
     
     nodes = slice.get_nodes()
-    
-    for node in nodes:
-        if node.get_name() != "meas-node":
-            print(f"\n***** On {node.get_name()}...")
-            print("\n***** Is github reachable?")
-            node.execute("git clone https://github.com/fabric-testbed/teaching-materials.git")
-            node.execute("ls -l")
-            node.execute("rm -rf teaching-materials")
-            print("\n***** Is PTP is enabled?")
-            node.execute("ps -ef | grep phc2sys")
-            print("\n*****Is Docker installed?")
-            node.execute("docker --help | head")
+    nodes = [node for node in nodes if node.get_name() != 'meas-node']
+
+    # All checks run as one command per node, and the nodes are probed concurrently.
+    probe = ('echo "***** Is github reachable?"; '
+             'git clone -q https://github.com/fabric-testbed/teaching-materials.git; '
+             'ls -l; rm -rf teaching-materials; '
+             'echo; echo "***** Is PTP is enabled?"; '
+             'ps -ef | grep phc2sys; '
+             'echo; echo "*****Is Docker installed?"; '
+             'docker --help | head')
+    executor = get_executor()
+    futures = [executor.submit(node.execute, probe, quiet=True) for node in nodes]
+    for node, future in zip(nodes, futures):
+        stdout, stderr = future.result()
+        print(f"\n***** On {node.get_name()}...\n")
+        print(stdout)
+        if stderr:
+            print(stderr)
 
 
 def nodes_ip_addrs(slice):
@@ -71,9 +82,11 @@ def nodes_ip_addrs(slice):
         interfaces = node.get_interfaces()
         exp_network_ips = []
         for interface in interfaces:
-            network = interface.toDict()['network']
-            if 'l3_meas_net' not in network:
-                node_ips[node.get_name()] = str(interface.get_ip_addr())
+            network = interface.get_network()
+            if network is None or 'l3_meas_net' in network.get_name():
+                continue
+            node_ips[node.get_name()] = str(interface.get_ip_addr())
+            break
         #         exp_network_ips.append(interface.get_ip_addr())
         # node_ips[node.get_name()] = exp_network_ips
     
@@ -94,7 +107,7 @@ def pull_owl_docker_image(node, image_name):
 def start_owl_sender(slice, src_node, dst_node, img_name, probe_freq=1, duration=600, no_ptp=False, src_addr=None, dst_addr=None):
     """
     Start OWL sender inside a Docker container on a remote node by running udp_sender.py.  
-    Docker container name will be in the form of "owl-sender_10.0.0.1-10.0.1.1"
+    Docker container name will be in the form of "owl-sender_10.0.0.1_10.0.1.1"
     
     :param slice:
     :type slice: fablib.Slice
@@ -121,7 +134,7 @@ def start_owl_sender(slice, src_node, dst_node, img_name, probe_freq=1, duration
     #stdout, stderr = node.execute(f'sudo docker pull {img_name}')
     
     # Figure out the node based on the IP address given
-    ip_list = nodes_ip_addrs(slice)
+    ip_list = nodes_ip_addrs(slice) if not (src_addr and dst_addr) else {}
     src_ip = ip_list[src_node.get_name()] if not src_addr else src_addr 
     dst_ip = ip_list[dst_node.get_name()] if not dst_addr else dst_addr
     
@@ -174,12 +187,13 @@ def start_owl_capturer(slice, dst_node, img_name, outfile=None, duration = 600,
     
     
     # Figure out the node based on the IP address given
-    ip_list = nodes_ip_addrs(slice)
-    dst_ip = ip_list[dst_node.get_name()] if not dst_addr else dst_addr    
+    dst_ip = nodes_ip_addrs(slice)[dst_node.get_name()] if not dst_addr else dst_addr    
     
     
     # check if it is already running
-    stdout, stderr = dst_node.execute("sudo docker ps --format '{{.Names}}'")
+    # Only fall back to sudo when the user is not in the docker group.
+    stdout, stderr = dst_node.execute("docker ps --format '{{.Names}}' 2>/dev/null || "
+                                      "sudo docker ps --format '{{.Names}}'", quiet=True)
     if f'owl-capturer_{dst_ip}' in stdout:
         print(f"capturer already running on {dst_node.get_name()}")
         return
@@ -295,31 +309,45 @@ def start_owl_all(slice, img_name, probe_freq=1, outfile=None, duration=600, del
     
     nodes = slice.get_nodes()
     nodes = [node for node in nodes if node.get_name() != 'meas-node']
-    products = list(itertools.product(nodes, nodes))
-    all_links = [link for link in products if link[0]!=link[1]]
+    all_links = list(itertools.permutations(nodes, 2))
 
 
-    for link in all_links:
+    if not all_links:
+        return
 
-        src_node = link[0]
-        dst_node = link[1]
+    # Look up the experiment IPs once instead of once per sender/capturer start.
+    ip_list = nodes_ip_addrs(slice)
+
+    # Each destination only needs one capturer, however many senders target it.
+    capturer_nodes = {}
+    for src_node, dst_node in all_links:
         print(f"{src_node.get_name()} --> {dst_node.get_name()}")
-              
-        print('Staring sender')
-        start_owl_sender(slice,
-                         src_node,
-                         dst_node,
-                         img_name,
-                         probe_freq=probe_freq,
-                         duration=duration)
-        
-        print(f'Staring capturer')
-        start_owl_capturer(slice,
-                           dst_node,
-                           img_name,
-                           outfile=outfile,
-                           duration=duration,
-                           delete_previous=delete_previous)
+        capturer_nodes.setdefault(dst_node.get_name(), dst_node)
+
+    # Links are independent so all senders and capturers are started concurrently.
+    print('Staring senders and capturers')
+    executor = get_executor()
+    futures = [executor.submit(start_owl_sender,
+                               slice,
+                               src_node,
+                               dst_node,
+                               img_name,
+                               probe_freq=probe_freq,
+                               duration=duration,
+                               src_addr=ip_list[src_node.get_name()],
+                               dst_addr=ip_list[dst_node.get_name()])
+               for src_node, dst_node in all_links]
+    futures += [executor.submit(start_owl_capturer,
+                                slice,
+                                dst_node,
+                                img_name,
+                                outfile=outfile,
+                                duration=duration,
+                                delete_previous=delete_previous,
+                                dst_addr=ip_list[dst_name])
+                for dst_name, dst_node in capturer_nodes.items()]
+    for future in as_completed(futures):
+        future.result()
 
 def stop_owl_sender(slice, src_node, dst_node, src_addr=None, dst_addr=None):
     """
@@ -338,11 +366,12 @@ def stop_owl_sender(slice, src_node, dst_node, src_addr=None, dst_addr=None):
     """
     
     # Figure out the node based on the IP address given
-    ip_list = nodes_ip_addrs(slice)
+    ip_list = nodes_ip_addrs(slice) if not (src_addr and dst_addr) else {}
     src_ip = ip_list[src_node.get_name()] if not src_addr else src_addr 
     dst_ip = ip_list[dst_node.get_name()] if not dst_addr else dst_addr
     
-    src_node.execute(f'sudo docker stop owl-sender_{src_ip}-{dst_ip}')
+    # Senders only emit UDP probes, so there is nothing to shut down gracefully.
+    src_node.execute(f'sudo docker kill owl-sender_{src_ip}_{dst_ip}')
     
     
     
@@ -359,10 +388,9 @@ def stop_owl_capturer(slice, dst_node, dst_addr=None):
     """
     
     # Figure out the node based on the IP address given
-    ip_list = nodes_ip_addrs(slice)
-    dst_ip = ip_list[dst_node.get_name()] if not dst_addr else dst_addr
+    dst_ip = nodes_ip_addrs(slice)[dst_node.get_name()] if not dst_addr else dst_addr
     
-    dst_node.execute(f'sudo docker stop owl-capturer_{dst_ip}')
+    dst_node.execute(f'sudo docker stop -t 1 owl-capturer_{dst_ip}')
 
     
 def stop_owl_all(slice):
@@ -375,9 +403,16 @@ def stop_owl_all(slice):
     
     nodes = slice.get_nodes()
     nodes = [node for node in nodes if node.get_name() != 'meas-node']
-    for node in nodes:
-        node.execute('hostname')
-        node.execute('sudo docker container stop $(sudo docker container ls -q --filter name=owl-*)')
+    if not nodes:
+        return
+
+    # Anchor the name filter so docker, not the shell, matches the owl- prefix.
+    cmd = 'sudo docker ps -q --filter "name=^owl-" | xargs -r sudo docker stop -t 1'
+    executor = get_executor()
+    futures = {node: executor.submit(node.execute, cmd, quiet=True) for node in nodes}
+    outputs = {node: future.result() for node, future in futures.items()}
+    for node, (stdout, stderr) in outputs.items():
+        print(f"{node.get_name()}: stopped {len(stdout.split())} owl container(s)")
 
 def check_owl_all(slice):
     """
@@ -409,35 +444,57 @@ def download_output(node, local_out_dir):
 
     local_dir = os.path.join(local_out_dir, node.get_name())
 
-    try:
-        os.makedirs(local_dir)
-    except(FileExistsError):
-        print("directory exists.")
+    os.makedirs(local_dir, exist_ok=True)
 
     # get the list of files on the remote dir  
     remote_out_dir = '/home/rocky/owl-output'
     
     stdout, stderr = node.execute(f"sudo ls {remote_out_dir}")
-    files = [x for x in stdout.split('\n') if x!='']
+    files = list(filter(None, stdout.splitlines()))
 
     if not files:
         print("no output files found")
         return
 
     else:
-        # This is necessary due to permissions
-        node.execute('mkdir -p /tmp/owl_copy')
+        remote_tar_path = '/tmp/owl_copy/owl-output.tgz'
+        local_tar_path = os.path.join(local_dir, 'owl-output.tgz')
+
+        # Bundle all the output files so they come down in a single transfer.
+        # tar streams to stdout so the archive is written (and owned) by the login user.
+        node.execute(f"mkdir -p /tmp/owl_copy && "
+                     f"sudo tar -C {remote_out_dir} -czf - {' '.join(map(shlex.quote, files))} > {remote_tar_path}")
+        node.download_file(local_tar_path, remote_tar_path)
+        node.execute(f"rm -f {remote_tar_path}")
+
+        # The archive comes from a remote node, so only plain files are extracted
+        # (filter is missing on Python builds without the tarfile extraction filters)
+        with tarfile.open(local_tar_path) as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(local_dir, filter='data')
+            else:
+                tar.extractall(local_dir)
+        os.remove(local_tar_path)
 
         for file_name in files:
             local_path = os.path.join(local_dir, file_name)
             remote_path = os.path.join(remote_out_dir, file_name)
+            print(f"Downloaded {remote_path} from {node.get_name()} to {local_path}")
 
-            remote_tmp_path = os.path.join('/tmp/owl_copy', file_name)
 
-            node.execute(f"sudo cp {remote_path} {remote_tmp_path}")
-            node.execute(f"sudo chmod 0664 {remote_tmp_path}")
-            node.download_file(local_path, remote_tmp_path)
-            print(f"Downloaded {remote_path} from {node.get_name()} to {local_path}")
+def download_output_all(slice, local_out_dir):
+    """
+    Download the owl output directories of all nodes in the slice 
+    concurrently. Each node's files are saved under local_out_dir/<node name>.
+
+    :param slice:
+    :type slice: fablib.Slice
+    :param local_out_dir: /path/to/local/dir/under/which/pcaps/will/be/saved
+    :type local_out_dir: str
+    """
 
-            node.execute(f"sudo rm {remote_tmp_path}") 
-            
+    nodes = slice.get_nodes()
+    nodes = [node for node in nodes if node.get_name() != 'meas-node']
+    futures = [get_executor().submit(download_output, node, local_out_dir) for node in nodes]
+    for future in as_completed(futures):
+        future.result()
@@ -22,8 +22,13 @@
 #
 
 
-import csv
-from decimal import Decimal
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from glob import glob
 #from configparser import ConfigParser
@@ -47,15 +52,239 @@ def list_pcap_files(root_dir):
     :rtype: [posix.Path]
     """
     
-    files_list = []
+    return [path.resolve() for path in Path(root_dir).rglob('*.pcap')]
+
+
+# pcap magic number -> (struct byte order, digits in the fractional timestamp)
+_PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 6),
+    b'\xa1\xb2\xc3\xd4': ('>', 6),
+    b'\x4d\x3c\xb2\xa1': ('<', 9),
+    b'\xa1\xb2\x3c\x4d': ('>', 9),
+}
+
+# Columns of the extracted OWL data
+_OWL_COLUMNS = ["src_ip", "sent_t", "dst_ip", "dst_t", "seq_n", "latency"]
+
+# Link types the raw reader can decode -> bytes before the EtherType (None: raw IP)
+_LINKTYPE_ETHERTYPE_OFFSET = {1: 12, 113: 14, 101: None, 228: None}
+
+
+def _timestamp_to_ns(timestamp):
+    """
+    Convert a decimal seconds timestamp to integer nano-seconds without going 
+    through float or Decimal.
+
+    :param timestamp: seconds, e.g. "1690000000.123456789"
+    :type timestamp: str
+    :rtype: int
+    """
+
+    sec, _, frac = timestamp.strip().partition('.')
+    return int(sec) * 1000000000 + int(frac[:9].ljust(9, '0'))
+
+
+def _owl_fields(pkt, dst_t=None):
+    """
+    Extract the csv fields from a scapy packet.
+
+    :param pkt: OWL probe packet
+    :type pkt: scapy.packet.Packet
+    :param dst_t: received time in seconds, if not taken from pkt.time
+    :type dst_t: str
+    :return: <src-ip, send-t, dst-ip, dst-t, seq-n, latency_nano>, or None if 
+        the packet is not a readable OWL probe
+    :rtype: [str]
+    """
+
+    # Fields are <src-ip, send-t,  
+    #             dst-ip, dst-t,  seq-n, latency_nano>
+    # latency_nano is in nano-seconds
+
+    try:
+        ip = pkt.getlayer(IP)
+        raw = pkt.getlayer(Raw)
+        if ip is None or raw is None:
+            raise ValueError("packet has no IP or payload layer")
+
+        send_t, seq_n = raw.load.decode().split(",")
+        if dst_t is None:
+            dst_t = str(pkt.time)  # pkt.time is type Decimal
+        latency_nano = _timestamp_to_ns(dst_t) - _timestamp_to_ns(send_t)
+
+        return [str(ip.src), send_t, str(ip.dst), dst_t, seq_n, str(latency_nano)]
+    except Exception as e:
+        print("\nEncountered an issue reading packet data")
+        print(e)
+        return None
+
+def _read_owl_pcap(pcapfile):
+    """
+    Yield the csv fields for each packet in a pcap file. Classic pcap files 
+    carrying IPv4/UDP probes are decoded directly from the record bytes, which 
+    avoids building a scapy packet per probe. Anything else (pcapng, other link 
+    types, non-UDP or malformed packets) is handed to scapy. Packets that are not 
+    readable OWL probes are reported and yielded as None.
     
-    for path in Path(root_dir).rglob('*.pcap'):
-        files_list.append(path.resolve())
+    :param pcapfile: pcap file path
+    :type pcapfile: str
+    :return: <src-ip, send-t, dst-ip, dst-t, seq-n, latency_nano> per probe, or None
+    :rtype: generator of [str]
+    """
+
+    with open(pcapfile, 'rb', buffering=1024*1024) as f:
+        header = f.read(24)
+        byte_order, ts_digits = _PCAP_MAGIC.get(header[:4], (None, None))
+        linktype = struct.unpack(byte_order + 'I', header[20:24])[0] & 0x0fffffff \
+            if byte_order and len(header) == 24 else None
+        if linktype not in _LINKTYPE_ETHERTYPE_OFFSET:
+            with PcapReader(pcapfile) as pkts:
+                for pkt in pkts:
+                    yield _owl_fields(pkt)
+            return
+
+        ethertype_offset = _LINKTYPE_ETHERTYPE_OFFSET[linktype]
+        record_header = struct.Struct(byte_order + 'IIII')
+        ns_per_tick = 10 ** (9 - ts_digits)
+        # Bind everything used per record to locals, outside the loop
+        read = f.read
+        unpack = record_header.unpack
+        from_bytes = int.from_bytes
+        inet_ntoa = socket.inet_ntoa
+        to_ns = _timestamp_to_ns
+        fallback_layer = conf.l2types.get(linktype, Raw)
+        while True:
+            rec = read(16)
+            if len(rec) < 16:
+                break
+            ts_sec, ts_frac, incl_len, _ = unpack(rec)
+            data = read(incl_len)
+            dst_t = f"{ts_sec}.{ts_frac:0{ts_digits}d}"
+            dst_ns = ts_sec * 1000000000 + ts_frac * ns_per_tick
+
+            try:
+                if ethertype_offset is None:
+                    ip_start = 0
+                else:
+                    ip_start = ethertype_offset + 2
+                    ethertype = data[ethertype_offset:ip_start]
+                    while ethertype == b'\x81\x00':  # 802.1Q tag
+                        ip_start += 4
+                        ethertype = data[ip_start-2:ip_start]
+                    if ethertype != b'\x08\x00':
+                        raise ValueError("not IPv4")
+                if data[ip_start] >> 4 != 4 or data[ip_start+9] != 17:
+                    raise ValueError("not IPv4/UDP")
+                udp_start = ip_start + (data[ip_start] & 0x0f) * 4
+                udp_len = from_bytes(data[udp_start+4:udp_start+6], 'big')
+                payload = data[udp_start+8:udp_start+udp_len]
+
+                send_t, seq_n = payload.decode().split(",")
+                fields = [inet_ntoa(data[ip_start+12:ip_start+16]),
+                          send_t,
+                          inet_ntoa(data[ip_start+16:ip_start+20]),
+                          dst_t,
+                          seq_n,
+                          str(dst_ns - to_ns(send_t))]
+            except (ValueError, IndexError, OSError):
+                # Let scapy dissect (and report on) anything unexpected
+                pkt = fallback_layer(data)
+                fields = _owl_fields(pkt, dst_t)
+
+            yield fields
+
+
+def _write_owl_rows(pcapfile, write_batch, verbose=False):
+    """
+    Convert one pcap file, passing its rows to write_batch in batches of up to 
+    100000 so memory use does not grow with the capture size.
+
+    :param pcapfile: pcap file path
+    :type pcapfile: str
+    :param write_batch: called with each batch of rows
+    :type write_batch: callable([[str]])
+    :param verbose: if True, prints each line as it is extracted
+    :type verbose: bool
+    :return: number of packets skipped because they were not readable OWL probes
+    :rtype: int
+    """
+
+    batch_size = 100000
+    rows = []
+    skipped = 0
+    for fields in _read_owl_pcap(pcapfile):
+        if fields is None:
+            skipped += 1
+            continue
+        if verbose:
+            print(fields)
+
+        rows.append(fields)
+        if len(rows) >= batch_size:
+            write_batch(rows)
+            rows = []
+    if rows:
+        write_batch(rows)
+    return skipped
+
+
+def _csv_batch_writer(f):
+    """
+    Batch writer for _write_owl_rows that appends rows to an open csv file.
+    
+    :param f: csv file opened for writing
+    :type f: file object
+    """
+
+    return lambda rows: pd.DataFrame(rows).to_csv(f, header=False, index=False)
+
+
+def _coerce_owl_columns(owl_df):
+    """
+    Convert the numeric OWL columns in place; values that do not parse become NaN.
     
-    return files_list
+    :param owl_df: data with the columns in _OWL_COLUMNS
+    :type owl_df: pandas.DataFrame
+    """
+
+    for column in ['sent_t', 'dst_t', 'seq_n', 'latency']:
+        owl_df[column] = pd.to_numeric(owl_df[column], errors='coerce')
 
 
-def convert_pcap_to_csv(pcap_files, outfile="out.csv", append_csv=False, verbose=False):
+def _pcap_files_with_data(pcap_files):
+    """
+    Drop zero-byte pcap files.
+    
+    :param pcap_files: list of pcap file paths
+    :type pcap_files: [posix.Path]
+    :rtype: [str]
+    """
+
+    pcapfiles_with_data = [str(f) for f in pcap_files if Path(f).stat().st_size > 0]
+    print("non-zero pcap files to be processed: ", pcapfiles_with_data)
+    return pcapfiles_with_data
+
+
+def _convert_one(pcapfile, shard_path):
+    """
+    Convert one pcap file into its own csv shard. Kept at module level so it 
+    can run in a worker process.
+
+    :param pcapfile: pcap file path
+    :type pcapfile: str
+    :param shard_path: csv file to write
+    :type shard_path: str
+    :return: shard_path and the number of skipped packets
+    :rtype: (str, int)
+    """
+
+    with open(shard_path, 'w', newline='', buffering=1024*1024) as f:
+        skipped = _write_owl_rows(pcapfile, _csv_batch_writer(f))
+    return shard_path, skipped
+
+
+def convert_pcap_to_csv(pcap_files, outfile="out.csv", append_csv=False, verbose=False,
+                        processes=None):
     """
     Extract data from the list of pcap files and write to one csv file.
     
@@ -67,6 +296,10 @@ def convert_pcap_to_csv(pcap_files, outfile="out.csv", append_csv=False, verbose
     :type append_csv: bool
     :param verbose: if True, prints each line as it is appended to csv
     :type verbose: bool
+    :param processes: number of worker processes to convert files in. None or 1 
+        converts in this process. Workers re-import the calling script, so a 
+        script using this must call it under an ``if __name__ == "__main__":`` guard.
+    :type processes: int
 
     """
 
@@ -81,72 +314,83 @@ def convert_pcap_to_csv(pcap_files, outfile="out.csv", append_csv=False, verbose
     
 
     # Remove zero-bye pcap files
-    pcapfiles_with_data = [str(f) for f in pcap_files if os.stat(f).st_size > 0]
-    print("non-zero pcap files to be processed: ", pcapfiles_with_data)
+    pcapfiles_with_data = _pcap_files_with_data(pcap_files)
 
     # Extract data
-    for pcapfile in pcapfiles_with_data:
-        print("file name:",  pcapfile)
-        pkts = rdpcap(pcapfile)
-
-        for pkt in pkts:
-            # Fields are <src-ip, send-t,  
-            #             dst-ip, dst-t,  seq-n, latency_nano>
-            # latency_nano is in nano-seconds
-
-            fields=[]
+    with open(outfile, 'a', newline='', buffering=1024*1024) as f:
+        if verbose or not processes or processes < 2 or len(pcapfiles_with_data) < 2:
+            for pcapfile in pcapfiles_with_data:
+                print("file name:",  pcapfile)
+                skipped = _write_owl_rows(pcapfile, _csv_batch_writer(f), verbose=verbose)
+                if skipped:
+                    print(f"Skipped {skipped} unreadable packets in {pcapfile}")
+        else:
+            # Parsing is CPU bound, so files are converted in worker processes into
+            # csv shards which are then appended to outfile in the original order.
+            # The caller's process has other threads running (ssh pool, log listener),
+            # so workers are not forked from it.
+            max_workers = min(processes, len(pcapfiles_with_data))
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            with tempfile.TemporaryDirectory() as shard_dir, \
+                    ProcessPoolExecutor(max_workers=max_workers, 
+                                        mp_context=multiprocessing.get_context(start_method)) as executor:
+                shards = [executor.submit(_convert_one,
+                                          pcapfile,
+                                          os.path.join(shard_dir, f"{i}.csv"))
+                          for i, pcapfile in enumerate(pcapfiles_with_data)]
+                for pcapfile, shard in zip(pcapfiles_with_data, shards):
+                    print("file name:",  pcapfile)
+                    shard_path, skipped = shard.result()
+                    # Worker output does not reach notebooks, so report skips from here
+                    if skipped:
+                        print(f"Skipped {skipped} unreadable packets in {pcapfile}")
+                    with open(shard_path, newline='') as shard_f:
+                        shutil.copyfileobj(shard_f, f, 1024*1024)
+
+
+def convert_pcap_to_parquet(pcap_files, outfile="out.parquet", verbose=False):
+    """
+    Extract data from the list of pcap files and write to one parquet file. 
+    Columns are stored typed, so OwlDataAnalyzer.from_parquet loads them without 
+    any text parsing. Rows are written in batches. Requires pyarrow.
+    
+    :param pcap_files: list of pcap file paths
+    :type pcap_files: [posix.Path]
+    :param outfile: name of parquet file
+    :type outfile: str
+    :param verbose: if True, prints each line as it is extracted
+    :type verbose: bool
+    """
 
-            # Field: src-ip
-            try:
-                fields.append(str(pkt[IP].src))
-            except(IndexError) as e:
-                print("\nEncountered an issue reading source IP")
-                print(e)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
 
-            # Field: send-t
-            try:
-                send_t, seq_n = pkt[Raw].load.decode().split(",")
-                send_t = Decimal(send_t)  # To prevent floating point issues
-                fields.append(str(send_t))
-            except (ValueError, IndexError) as e: 
-                print("\nEncountered an issue reading payload data")
-                print(e)
-               
-            # Field: dst-ip
-            try:
-                fields.append(str(pkt[IP].dst))
-            except(IndexError) as e:
-                print("\nEncountered an issue reading destination IP")
-                print(e)
-                
-            # Field: dst-t
-            try:
-                fields.append(str(pkt.time))  # pkt.time is type Decimal
-            except(IndexError) as e:
-                print("\nEncountered an issue reading received time")
-                print(e)
-                
-            # Field: seq-n
-            try:
-                fields.append(seq_n)
-            except(ValueError) as e:
-                print("\nEncountered an issue reading payload data")
-                print(e)            
+    if os.path.isfile(outfile):
+        print(f"Parquet file {outfile} already exists. Delete the file first.")
+        return
 
-            # Field: latency
-            try:
-                latency_nano = (pkt.time-send_t)*1000000000
-                fields.append(str(int(latency_nano)))
-            except(ValueError) as e:
-                print(e)
+    # Remove zero-bye pcap files
+    pcapfiles_with_data = _pcap_files_with_data(pcap_files)
 
-            if verbose:
-                print(fields)
+    # Cleaning (dropping unparsable rows) is left to OwlDataAnalyzer
+    schema = pa.schema([('src_ip', pa.string()), ('sent_t', pa.float64()),
+                        ('dst_ip', pa.string()), ('dst_t', pa.float64()),
+                        ('seq_n', pa.int64()), ('latency', pa.int64())])
 
+    def write_batch(rows):
+        owl_df = pd.DataFrame(rows, columns=_OWL_COLUMNS)
+        _coerce_owl_columns(owl_df)
+        for column in ['seq_n', 'latency']:
+            # Non-integral values are treated as unparsable, like any other bad value
+            owl_df[column] = owl_df[column].where(owl_df[column] % 1 == 0).astype('Int64')
+        writer.write_table(pa.Table.from_pandas(owl_df, schema=schema, preserve_index=False))
 
-            with open(outfile, 'a') as f:
-                writer = csv.writer(f)
-                writer.writerow(fields)   
+    with pq.ParquetWriter(outfile, schema, compression='zstd') as writer:
+        for pcapfile in pcapfiles_with_data:
+            print("file name:",  pcapfile)
+            skipped = _write_owl_rows(pcapfile, write_batch, verbose=verbose)
+            if skipped:
+                print(f"Skipped {skipped} unreadable packets in {pcapfile}")
 
 
 class OwlDataAnalyzer():
@@ -159,22 +403,59 @@ class OwlDataAnalyzer():
         :type owl_csv: str
         """
         
-        owl_df = pd.read_csv(owl_csv, 
-                             header=None, 
-                             names=["src_ip", "sent_t", "dst_ip", "dst_t", "seq_n", "latency"])
+        try:
+            # Parse straight into the final column types
+            owl_df = pd.read_csv(owl_csv, 
+                                 header=None, 
+                                 names=_OWL_COLUMNS,
+                                 dtype={'src_ip': 'str', 'sent_t': 'float64', 
+                                        'dst_ip': 'str', 'dst_t': 'float64', 
+                                        'seq_n': 'Int64', 'latency': 'Int64'})
+        except ValueError:
+            # The file has malformed rows, so coerce column by column instead
+            owl_df = pd.read_csv(owl_csv, 
+                                 header=None, 
+                                 names=_OWL_COLUMNS)
+            _coerce_owl_columns(owl_df)
+
+        self._set_data(owl_df)
+
+
+    @classmethod
+    def from_parquet(cls, owl_parquet):
+        """
+        Create an analyzer from a parquet file written by convert_pcap_to_parquet.
         
-        # Data cleaning
-        owl_df['src_ip'] = owl_df['src_ip'].astype('str')
-        owl_df['sent_t'] = pd.to_numeric(owl_df['sent_t'], errors='coerce')
-        owl_df['sent_t_datetime'] = pd.to_datetime(owl_df['sent_t'], unit='s', errors='coerce')
-        owl_df['dst_t'] = pd.to_numeric(owl_df['dst_t'], errors='coerce')
-        owl_df['dst_t_datetime'] = pd.to_datetime(owl_df['dst_t'], unit='s', errors='coerce')
-        owl_df['seq_n'] = pd.to_numeric(owl_df['seq_n'], errors='coerce')
-        owl_df['latency'] = pd.to_numeric(owl_df['latency'], errors='coerce')
-        owl_df = owl_df.dropna(how='any')
-        owl_df['latency'] = owl_df['latency'].astype(int)
+        :param owl_parquet: parquet file containing data extracted from pcap files.
+        :type owl_parquet: str
+        :rtype: OwlDataAnalyzer
+        """
+
+        analyzer = cls.__new__(cls)
+        analyzer._set_data(pd.read_parquet(owl_parquet))
+        return analyzer
+
+
+    def _set_data(self, owl_df):
+        """
+        Clean the extracted data and reset the per-node caches.
         
-        self.owl_df = owl_df.dropna(how='any')
+        :param owl_df: data with the columns in _OWL_COLUMNS
+        :type owl_df: pandas.DataFrame
+        """
+
+        # Data cleaning
+        # The *_datetime columns are only built for the rows that are returned
+        self.owl_df = owl_df.dropna(how='any').astype({'src_ip': 'str',
+                                                       'seq_n': 'int64', 
+                                                       'latency': 'int64'})
+        self._pair_rows = None
+
+        # Node/site metadata looked up through fablib, cached by node and site name
+        self._ip_cache = {}
+        self._site_cache = {}
+        self._location_cache = {}
+        self._resources = None
  
 
     def get_dataframe(self):
@@ -183,6 +464,7 @@ class OwlDataAnalyzer():
         
         :rtype: pandas.DataFrame
         """
+        self.owl_df = self._with_datetime_columns(self.owl_df)
         return (self.owl_df)
     
     
@@ -199,13 +481,13 @@ class OwlDataAnalyzer():
         # If IP addresses not given, assume there is only 1
 
         if not src_ip:
-            src_ip = self.list_experiment_ip_addrs(src_node)[0]
+            src_ip = self._experiment_ip_addrs(src_node)[0]
         if not dst_ip:
-            dst_ip = self.list_experiment_ip_addrs(dst_node)[0]
+            dst_ip = self._experiment_ip_addrs(dst_node)[0]
 
         f_data = self.filter_data(src_ip, dst_ip)
         
-        print(f"\n*****{src_ip} ({src_node.get_site()}) --> {dst_ip} ({dst_node.get_site()})")
+        print(f"\n*****{src_ip} ({self._site(src_node)}) --> {dst_ip} ({self._site(dst_node)})")
         print(f"Number of samples {len(f_data.index)}")
         print(f"Median Latency (ns): {f_data['latency'].median()}")
         print(f"Median Latency (micros): {(f_data['latency'].median())/1000}")
@@ -224,9 +506,32 @@ class OwlDataAnalyzer():
         :param src[dst]_ip: Source and destination IPv4 addresses
         :type src[dst]_ip: str
         """
-            
-        return self.owl_df.loc[(self.owl_df['src_ip']==src_ip) &
-                               (self.owl_df['dst_ip']==dst_ip)]          
+
+        # Row positions for each (src_ip, dst_ip) pair, built on first use so
+        # repeated lookups do not rescan the whole frame
+        if self._pair_rows is None:
+            self._pair_rows = self.owl_df.groupby(['src_ip', 'dst_ip'], sort=False).indices
+
+        rows = self._pair_rows.get((src_ip, dst_ip))
+        filtered = self.owl_df.iloc[0:0] if rows is None else self.owl_df.iloc[rows]
+        return self._with_datetime_columns(filtered)
+
+
+    @staticmethod
+    def _with_datetime_columns(df):
+        """
+        Return df with the sent_t_datetime and dst_t_datetime columns, adding 
+        them if they have not been built yet.
+        
+        :param df: OWL data (or a subset of it)
+        :type df: pandas.DataFrame
+        :rtype: pandas.DataFrame
+        """
+
+        if 'sent_t_datetime' in df.columns:
+            return df
+        return df.assign(sent_t_datetime=pd.to_datetime(df['sent_t'], unit='s', errors='coerce'),
+                         dst_t_datetime=pd.to_datetime(df['dst_t'], unit='s', errors='coerce'))
 
     
     
@@ -241,9 +546,9 @@ class OwlDataAnalyzer():
         """       
 
         if not src_ip:
-            src_ip = self.list_experiment_ip_addrs(src_node)[0]
+            src_ip = self._experiment_ip_addrs(src_node)[0]
         if not dst_ip:
-            dst_ip = self.list_experiment_ip_addrs(dst_node)[0]
+            dst_ip = self._experiment_ip_addrs(dst_node)[0]
             
         filtered = self.filter_data(src_ip, dst_ip)
         # import plotly.io as pio
@@ -253,7 +558,7 @@ class OwlDataAnalyzer():
         fig = go.Figure([go.Scatter(x=filtered['sent_t_datetime'],
                                     y=filtered['latency'])])
         fig.update_layout(
-            title = f'{src_ip} ({src_node.get_site()}) -> {dst_ip} ({dst_node.get_site()})',
+            title = f'{src_ip} ({self._site(src_node)}) -> {dst_ip} ({self._site(dst_node)})',
             xaxis_title = "Sent time",
             yaxis_title = "latency in nano-sec",
             yaxis = dict(
@@ -273,31 +578,64 @@ class OwlDataAnalyzer():
         :rtype: pandas.DataFrame
         """
         
-        fablib = fablib_manager()
-        r = fablib.get_resources()
-        
-        df = pd.DataFrame(columns = ['node_name', 'site_name', 'lon', 'lat', 'exp_ip'])
+        rows = []
         for node in nodes:
             node_name = node.get_name()
             
             if node_name == "meas-node":
-                pass
-            else: 
-                site_name = node.get_site()
-                lat, lon = r.get_location_lat_long(site_name)
-                node_ip = self.list_experiment_ip_addrs(node)[0]
-
-                new_row = pd.DataFrame([{
-                                'node_name': node_name,
-                                'site_name': site_name,
-                                'lon': lon,
-                                'lat': lat,
-                                'exp_ip': node_ip}])
-                df = pd.concat([df, new_row]) 
+                continue
+
+            site_name = self._site(node)
+            lat, lon = self._location(site_name)
+            node_ip = self._experiment_ip_addrs(node)[0]
+
+            rows.append({
+                    'node_name': node_name,
+                    'site_name': site_name,
+                    'lon': lon,
+                    'lat': lat,
+                    'exp_ip': node_ip})
+
+        # Build the frame once instead of concatenating a row at a time
+        df = pd.DataFrame(rows, columns = ['node_name', 'site_name', 'lon', 'lat', 'exp_ip'])
                 
         return df
    
 
+    def _experiment_ip_addrs(self, node):
+        """
+        Cached list_experiment_ip_addrs, keyed by node name.
+        """
+
+        node_name = node.get_name()
+        if node_name not in self._ip_cache:
+            self._ip_cache[node_name] = self.list_experiment_ip_addrs(node)
+        return self._ip_cache[node_name]
+
+
+    def _site(self, node):
+        """
+        Cached node.get_site(), keyed by node name.
+        """
+
+        node_name = node.get_name()
+        if node_name not in self._site_cache:
+            self._site_cache[node_name] = node.get_site()
+        return self._site_cache[node_name]
+
+
+    def _location(self, site_name):
+        """
+        Cached (lat, lon) of a site. FABRIC resources are only fetched the first time.
+        """
+
+        if site_name not in self._location_cache:
+            if self._resources is None:
+                self._resources = fablib_manager().get_resources()
+            self._location_cache[site_name] = self._resources.get_location_lat_long(site_name)
+        return self._location_cache[site_name]
+
+
     @staticmethod
     def print_map(df):
         """